@@ -1,11 +1,13 @@
 """Autonomy loop: think → decide → act/message."""
+import asyncio
 import logging
+import time
 from datetime import datetime, timezone
 
 from telegram.ext import ContextTypes
 
 from config import Config
-from memory import MemoryManager
+from memory import MemoryManager, StalePreconditionError
 from claude_client import ClaudeClient
 
 logger = logging.getLogger(__name__)
@@ -17,57 +19,69 @@ class AutonomyLoop:
         self.memory = memory
         self.claude = claude
         self.bot = None  # Set after bot is created
+        self._quiet_mask = self._build_quiet_mask(config.quiet_hours_start, config.quiet_hours_end)
 
     def set_bot(self, bot):
         """Set the bot reference for sending proactive messages."""
         self.bot = bot
 
-    def _in_quiet_hours(self) -> bool:
-        hour = datetime.now(timezone.utc).hour
-        start = self.config.quiet_hours_start
-        end = self.config.quiet_hours_end
+    @staticmethod
+    def _build_quiet_mask(start: int, end: int) -> int:
+        """Bit h is set when UTC hour h falls in quiet hours."""
+        mask = 0
+        for hour in range(24):
+            if start > end:
+                # Wraps midnight, e.g. 23-8
+                quiet = hour >= start or hour < end
+            else:
+                quiet = start <= hour < end
+            mask |= quiet << hour
+        return mask
 
-        if start > end:
-            # Wraps midnight, e.g. 23-8
-            return hour >= start or hour < end
-        else:
-            return start <= hour < end
+    def _in_quiet_hours(self, now: datetime) -> bool:
+        return bool((self._quiet_mask >> now.hour) & 1)
 
     def _cooldown_active(self) -> bool:
-        if self.bot is None or self.bot.last_message_time is None:
+        if self.bot is None or self.bot.last_message_monotonic is None:
             return False
-        elapsed = (datetime.now(timezone.utc) - self.bot.last_message_time).total_seconds()
+        elapsed = time.monotonic() - self.bot.last_message_monotonic
         return elapsed < self.config.proactive_cooldown_hours * 3600
 
-    def _daily_limit_reached(self) -> bool:
+    def _daily_limit_reached(self, now: datetime) -> bool:
         if self.bot is None:
             return False
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        today = now.toordinal()
         if self.bot.proactive_messages_date != today:
             return False
         return self.bot.proactive_messages_today >= self.config.max_proactive_messages_per_day
 
     def _hours_since_last_message(self) -> float:
-        if self.bot is None or self.bot.last_message_time is None:
+        if self.bot is None or self.bot.last_message_monotonic is None:
             return 999.0
-        elapsed = (datetime.now(timezone.utc) - self.bot.last_message_time).total_seconds()
+        elapsed = time.monotonic() - self.bot.last_message_monotonic
         return elapsed / 3600
 
     async def run_cycle(self, context: ContextTypes.DEFAULT_TYPE):
         """Run one autonomy cycle. Called by PTB JobQueue."""
+        ctx_task = None
         try:
             logger.info("Autonomy cycle starting...")
+            now = datetime.now(timezone.utc)
 
             # Gate 1: Quiet hours
-            if self._in_quiet_hours():
+            if self._in_quiet_hours(now):
                 logger.info("Autonomy cycle skipped: quiet hours")
                 return
 
             # Phase 1: Think (cheap, Haiku)
-            lightweight_context = self.memory.load_lightweight_context()
-            current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+            lightweight_context, light_hashes = await self.memory.load_lightweight_context_with_hashes_async()
+            current_time = now.strftime("%Y-%m-%d %H:%M UTC")
             hours_since = self._hours_since_last_message()
 
+            # Prefetch the full context while thinking so a cycle that ends up
+            # messaging doesn't pay for the load serially
+            ctx_task = asyncio.create_task(self.memory.load_full_context_async())
+
             decision = await self.claude.think(
                 lightweight_context, current_time, hours_since
             )
@@ -81,8 +95,12 @@ class AutonomyLoop:
             # Handle queue updates
             queue_updates = decision.get("queue_updates")
             if queue_updates:
-                self.memory.update_file("queue.md", queue_updates)
-                logger.info("Queue updated by autonomy loop")
+                try:
+                    # Don't clobber a queue.md rewritten since thinking read it
+                    await self.memory.update_file_async("queue.md", queue_updates, light_hashes["queue.md"])
+                    logger.info("Queue updated by autonomy loop")
+                except StalePreconditionError as e:
+                    logger.warning(f"Discarded stale queue update: {e}")
 
             # Phase 2: Maybe send proactive message
             should_message = decision.get("should_message", False)
@@ -96,27 +114,39 @@ class AutonomyLoop:
                 return
 
             # Gate 3: Daily limit
-            if self._daily_limit_reached():
+            if self._daily_limit_reached(now):
                 logger.info("Proactive message suppressed: daily limit reached")
                 return
 
             # Compose message (quality, Sonnet)
             trigger_reason = decision.get("message_reason", "autonomy loop trigger")
-            full_context = self.memory.load_full_context()
+            full_context = await ctx_task
+            if queue_updates:
+                # The prefetch may predate the queue update above
+                full_context = await self.memory.load_full_context_async()
             message = await self.claude.compose_proactive_message(
                 full_context, trigger_reason, current_time
             )
 
             # Send to all allowed users
             if self.bot and self.config.allowed_user_ids:
-                for user_id in self.config.allowed_user_ids:
-                    try:
-                        await self.bot.send_proactive_message(user_id, message)
+                user_ids = list(self.config.allowed_user_ids)
+                results = await asyncio.gather(
+                    *(self.bot.send_proactive_message(uid, message) for uid in user_ids),
+                    return_exceptions=True,
+                )
+                for user_id, result in zip(user_ids, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Failed to send proactive message to {user_id}: {result}")
+                    else:
                         logger.info(f"Proactive message sent to {user_id}")
-                    except Exception as e:
-                        logger.error(f"Failed to send proactive message to {user_id}: {e}")
             else:
                 logger.warning("No bot or no allowed user IDs — proactive message not sent")
 
         except Exception as e:
             logger.error(f"Autonomy cycle failed: {e}", exc_info=True)
+        finally:
+            if ctx_task is not None and not ctx_task.cancel():
+                # Already finished: retrieve any error so asyncio doesn't
+                # report it as never retrieved
+                ctx_task.exception()
@@ -1,8 +1,12 @@
 """Telegram bot handlers, session management, and synthesis triggers."""
 import asyncio
+import io
 import logging
+import time
+from collections import OrderedDict
+from itertools import islice
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 from telegram import Update
 from telegram.ext import (
@@ -14,41 +18,60 @@ from telegram.ext import (
 )
 
 from config import Config
-from memory import MemoryManager
+from memory import MEMORY_FILES, MemoryManager, StalePreconditionError
 from claude_client import ClaudeClient
 
 logger = logging.getLogger(__name__)
 
+# Streamed replies are sent once this much text has built up
+STREAM_FLUSH_CHARS = 800
 
-def split_message(text: str, max_len: int = 4096) -> list[str]:
+# Session store bounds: least recently used sessions are evicted past
+# MAX_SESSIONS, and sessions keep only their recent turns after synthesis
+MAX_SESSIONS = 512
+SESSION_KEEP_MESSAGES = 20
+
+
+def split_message(text: str, max_len: int = 4096) -> Iterable[str]:
     """Split a message into chunks respecting Telegram's character limit."""
     if len(text) <= max_len:
-        return [text]
+        return (text,)  # Common case: no generator needed
+    return _iter_chunks(text, max_len)
 
-    chunks = []
-    while text:
-        if len(text) <= max_len:
-            chunks.append(text)
-            break
 
+def _iter_chunks(text: str, max_len: int) -> Iterator[str]:
+    """Walk the text by index so the remainder is never copied between chunks."""
+    start, end = 0, len(text)
+    while start < end:
+        if end - start <= max_len:
+            yield text[start:]
+            return
+
+        limit = start + max_len
         # Try to split at paragraph boundary
-        split_at = text.rfind("\n\n", 0, max_len)
+        split_at = text.rfind("\n\n", start, limit)
         if split_at == -1:
             # Try sentence boundary
-            split_at = text.rfind(". ", 0, max_len)
+            split_at = text.rfind(". ", start, limit)
             if split_at != -1:
                 split_at += 1  # Include the period
         if split_at == -1:
             # Try any newline
-            split_at = text.rfind("\n", 0, max_len)
+            split_at = text.rfind("\n", start, limit)
         if split_at == -1:
             # Hard split
-            split_at = max_len
+            split_at = limit
 
-        chunks.append(text[:split_at].rstrip())
-        text = text[split_at:].lstrip()
+        # Trim whitespace around the boundary without allocating stripped copies
+        chunk_end = split_at
+        while chunk_end > start and text[chunk_end - 1].isspace():
+            chunk_end -= 1
+        if chunk_end > start:
+            yield text[start:chunk_end]
 
-    return chunks
+        start = split_at
+        while start < end and text[start].isspace():
+            start += 1
 
 
 class Session:
@@ -58,25 +81,42 @@ class Session:
         self.messages: list[dict] = []  # {"role": "user"/"assistant", "content": str}
         self.last_activity: datetime = datetime.now(timezone.utc)
         self.message_count: int = 0
+        self._text_cache: tuple[int, str] = (0, "")  # (messages rendered, text)
 
-    def add_message(self, role: str, content: str):
+    def add_message(self, role: str, content: str, now: Optional[datetime] = None):
         self.messages.append({"role": role, "content": content})
-        self.last_activity = datetime.now(timezone.utc)
+        self.last_activity = now or datetime.now(timezone.utc)
         self.message_count += 1
 
-    def is_expired(self, timeout_minutes: int) -> bool:
-        elapsed = (datetime.now(timezone.utc) - self.last_activity).total_seconds()
+    def is_expired(self, timeout_minutes: int, now: Optional[datetime] = None) -> bool:
+        elapsed = ((now or datetime.now(timezone.utc)) - self.last_activity).total_seconds()
         return elapsed > timeout_minutes * 60
 
     def get_conversation_text(self) -> str:
-        lines = []
-        for msg in self.messages:
-            prefix = "User" if msg["role"] == "user" else "Claude"
-            lines.append(f"{prefix}: {msg['content']}")
-        return "\n\n".join(lines)
+        # Messages are append-only between trim()/clear(), so only render new ones
+        rendered, text = self._text_cache
+        if rendered == len(self.messages):
+            return text
+
+        buf = io.StringIO()
+        buf.write(text)
+        for i, msg in enumerate(islice(self.messages, rendered, None), rendered):
+            if i:
+                buf.write("\n\n")
+            buf.write("User: " if msg["role"] == "user" else "Claude: ")
+            buf.write(msg["content"])
+        text = buf.getvalue()
+        self._text_cache = (len(self.messages), text)
+        return text
+
+    def trim(self, keep: int):
+        """Drop all but the last `keep` messages."""
+        del self.messages[:-keep]
+        self._text_cache = (0, "")
 
     def clear(self):
         self.messages.clear()
+        self._text_cache = (0, "")
         self.message_count = 0
         self.last_activity = datetime.now(timezone.utc)
 
@@ -86,11 +126,12 @@ class AmbientBot:
         self.config = config
         self.memory = memory
         self.claude = claude
-        self.sessions: dict[int, Session] = {}
-        self.last_message_time: Optional[datetime] = None
+        self._auth_open = not config.allowed_user_ids  # No allow-list: everyone may talk
+        self.sessions: OrderedDict[int, Session] = OrderedDict()
+        self.last_message_monotonic: Optional[float] = None  # time.monotonic() of the last message sent
         self.proactive_messages_today: int = 0
-        self.proactive_messages_date: Optional[str] = None
-        self._synthesis_lock = asyncio.Lock()
+        self.proactive_messages_date: int = 0  # UTC date as date.toordinal()
+        self._write_lock = asyncio.Lock()  # Memory files are shared by all users
         self._ptb_bot = None  # Set via set_ptb_bot() to reuse for proactive messages
 
     def set_ptb_bot(self, bot):
@@ -98,68 +139,160 @@ class AmbientBot:
         self._ptb_bot = bot
 
     def _is_authorized(self, user_id: int) -> bool:
-        if not self.config.allowed_user_ids:
-            return True
-        return user_id in self.config.allowed_user_ids
+        return self._auth_open or user_id in self.config.allowed_user_ids
 
     def _get_session(self, user_id: int) -> Session:
-        if user_id not in self.sessions:
-            self.sessions[user_id] = Session()
-        return self.sessions[user_id]
+        session = self.sessions.get(user_id)
+        if session is None:
+            session = self.sessions[user_id] = Session()
+            if len(self.sessions) > MAX_SESSIONS:
+                self._evict_session(next(iter(self.sessions)))
+        else:
+            self.sessions.move_to_end(user_id)
+        return session
+
+    def _evict_session(self, user_id: int):
+        """Drop a session, synthesizing any conversation it still holds."""
+        session = self.sessions.pop(user_id)
+        if session.messages:
+            asyncio.create_task(self._maybe_synthesize(user_id, session))
 
-    async def _maybe_synthesize(self, user_id: int, session: Session):
-        """Run memory synthesis if threshold reached."""
-        async with self._synthesis_lock:
-            try:
-                memory_context = self.memory.load_full_context()
-                conversation_text = session.get_conversation_text()
+    async def sweep_sessions(self, context: ContextTypes.DEFAULT_TYPE):
+        """Evict sessions idle well past the timeout. Called by PTB JobQueue."""
+        idle_minutes = self.config.session_timeout_minutes * 4
+        now = datetime.now(timezone.utc)
+        stale = [uid for uid, s in self.sessions.items() if s.is_expired(idle_minutes, now)]
+        for user_id in stale:
+            self._evict_session(user_id)
+        if stale:
+            logger.info(f"Evicted {len(stale)} idle sessions")
+
+    async def _maybe_synthesize(
+        self, user_id: int, session: Session,
+        memory_context: Optional[str] = None, memory_hashes: Optional[dict[str, str]] = None,
+    ) -> bool:
+        """Run memory synthesis; return whether the conversation was saved.
+
+        The LLM roundtrip runs unlocked so concurrent users synthesize in
+        parallel; only the memory writes are serialized, under one bot-wide
+        lock since every user shares the memory files. Pass memory_context and
+        the memory_hashes it was built from when the caller already loaded
+        them; otherwise both are loaded here. If another writer changes a file
+        in the meantime, synthesis is retried once against the fresh memory.
+        """
+        try:
+            conversation_text = session.get_conversation_text()
+            for attempt in (1, 2):
+                if memory_context is None or memory_hashes is None:
+                    memory_context, memory_hashes = await self.memory.load_full_context_with_hashes_async()
                 updates = await self.claude.synthesize(memory_context, conversation_text)
 
-                for filename, content in updates.items():
-                    if filename != "identity.md":
-                        self.memory.update_file(filename, content)
-                        logger.info(f"Updated memory file: {filename}")
+                # Skip nulls and other non-text values the model emits for omitted files
+                updates = {
+                    fn: content for fn, content in updates.items()
+                    if fn in MEMORY_FILES and fn != "identity.md" and isinstance(content, str)
+                }
+                async with self._write_lock:
+                    try:
+                        # Files changed since the context was read won't be clobbered
+                        await self.memory.update_files_batch_async(updates, memory_hashes)
+                    except StalePreconditionError as e:
+                        logger.warning(f"Stale synthesis for user {user_id} (attempt {attempt}): {e}")
+                        memory_context = memory_hashes = None
+                        continue
+                for filename in updates:
+                    logger.info(f"Updated memory file: {filename}")
+
+                session.trim(SESSION_KEEP_MESSAGES)
+                return True
+
+            logger.error(f"Synthesis for user {user_id} abandoned: memory kept changing underneath it")
+            return False
 
+        except Exception as e:
+            logger.error(f"Synthesis failed: {e}")
+            return False
+
+    async def _flush_stream(self, update: Update, pending: str) -> tuple[str, bool]:
+        """Send the completed paragraphs of a streamed reply.
+
+        Returns the unsent tail and whether sending succeeded. A failed send is
+        logged rather than raised, and the text it didn't deliver stays in the
+        tail, so the caller can keep reading the stream and send it at the end.
+        """
+        cut = pending.rfind("\n\n")
+        if cut > 0:
+            head, tail = pending[:cut], pending[cut:].lstrip()
+        elif len(pending) > 4096:
+            head, tail = pending, ""
+        else:
+            return pending, True
+        chunks = list(split_message(head))
+        for i, chunk in enumerate(chunks):
+            try:
+                await update.message.reply_text(chunk)
             except Exception as e:
-                logger.error(f"Synthesis failed: {e}")
+                logger.error(f"Failed to send streamed reply: {e}")
+                return "\n\n".join([*chunks[i:], tail] if tail else chunks[i:]), False
+        return tail, True
 
     async def _handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         if not self._is_authorized(user_id):
             return
 
+        now = datetime.now(timezone.utc)
         session = self._get_session(user_id)
         user_text = update.message.text
 
         # Check for session expiry — synthesize old session first
-        if session.messages and session.is_expired(self.config.session_timeout_minutes):
+        if session.messages and session.is_expired(self.config.session_timeout_minutes, now):
             logger.info(f"Session expired for user {user_id}, synthesizing...")
-            await self._maybe_synthesize(user_id, session)
-            session.clear()
+            # Keep the conversation if it couldn't be saved; a later synthesis retries it
+            if await self._maybe_synthesize(user_id, session):
+                session.clear()
 
         # Add user message
-        session.add_message("user", user_text)
-
-        # Get response
+        session.add_message("user", user_text, now)
+
+        # Stream the response, sending completed paragraphs as they arrive.
+        # After a failed send, keep reading and send the rest at the end.
+        response_parts = []
+        pending = ""
+        flushing = True
+        memory_context = memory_hashes = None
+        stream = None
         try:
-            memory_context = self.memory.load_full_context()
-            response = await self.claude.chat(memory_context, session.messages)
+            memory_context, memory_hashes = await self.memory.load_full_context_with_hashes_async()
+            stream = self.claude.chat_stream(memory_context, session.messages)
+            async for delta in stream:
+                response_parts.append(delta)
+                pending += delta
+                if flushing and len(pending) >= STREAM_FLUSH_CHARS:
+                    pending, flushing = await self._flush_stream(update, pending)
         except Exception as e:
             logger.error(f"Chat failed: {e}")
-            response = "I'm having trouble thinking right now. Give me a moment and try again."
+            if not response_parts:
+                pending = "I'm having trouble thinking right now. Give me a moment and try again."
+                response_parts.append(pending)
+        finally:
+            if stream is not None:
+                await stream.aclose()
 
         # Add assistant response
+        response = "".join(response_parts)
         session.add_message("assistant", response)
-        self.last_message_time = datetime.now(timezone.utc)
+        self.last_message_monotonic = time.monotonic()
 
-        # Send response (handle long messages)
-        for chunk in split_message(response):
-            await update.message.reply_text(chunk)
+        # Send whatever is left (handle long messages)
+        if pending.strip():
+            for chunk in split_message(pending):
+                await update.message.reply_text(chunk)
 
         # Check synthesis threshold
         if session.message_count >= self.config.synthesis_message_threshold:
             logger.info(f"Message threshold reached for user {user_id}, synthesizing...")
-            asyncio.create_task(self._maybe_synthesize(user_id, session))
+            asyncio.create_task(self._maybe_synthesize(user_id, session, memory_context, memory_hashes))
             session.message_count = 0  # Reset counter
 
     async def _start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -209,10 +342,11 @@ class AmbientBot:
         for chunk in split_message(text):
             await self._ptb_bot.send_message(chat_id=user_id, text=chunk)
 
-        self.last_message_time = datetime.now(timezone.utc)
+        now = datetime.now(timezone.utc)
+        self.last_message_monotonic = time.monotonic()
 
         # Track daily count
-        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        today = now.toordinal()
         if self.proactive_messages_date != today:
             self.proactive_messages_today = 0
             self.proactive_messages_date = today
@@ -1,10 +1,17 @@
 """OpenRouter API wrapper for chat, synthesis, and thinking."""
+import asyncio
+import hashlib
 import json
 import logging
+import re
+import time
+from typing import Any, AsyncIterator, Callable
 
+import httpx
 from openai import AsyncOpenAI
 
 from config import Config
+from jsonutil import json_loads
 from prompts import (
     chat_system_prompt,
     synthesis_prompt,
@@ -14,61 +21,175 @@ from prompts import (
 
 logger = logging.getLogger(__name__)
 
+# Exact-prompt response cache for synthesis. Chat is never cached, nor is
+# thinking: its prompt carries the current minute, and replaying a decision
+# would re-apply its journal entry and queue updates.
+COMPLETION_CACHE_SIZE = 128
+COMPLETION_CACHE_TTL_SECONDS = 3600
+
+# A ```json fence wins over any other fence; either may be left unclosed
+_JSON_FENCE_RE = re.compile(r"```json\s*(.*?)(?:```|\Z)", re.S)
+_ANY_FENCE_RE = re.compile(r"```\s*(.*?)(?:```|\Z)", re.S)
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _parse_json_response(text: str):
+    """Decode the first JSON value in a response, inside a code fence if present."""
+    m = _JSON_FENCE_RE.search(text) or _ANY_FENCE_RE.search(text)
+    payload = (m.group(1) if m else text).lstrip()
+    try:
+        return json_loads(payload)
+    except json.JSONDecodeError:
+        # e.g. trailing prose, which raw_decode tolerates (orjson's error subclasses this one)
+        pass
+    obj, _ = _JSON_DECODER.raw_decode(payload)
+    return obj
+
 
 class ClaudeClient:
     def __init__(self, config: Config):
         self.config = config
+        # One keep-alive HTTP/2 pool shared by all OpenRouter calls
+        self._httpx = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=16, max_connections=32),
+            timeout=httpx.Timeout(60.0, connect=10.0),
+        )
         self.client = AsyncOpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=config.openrouter_api_key,
+            http_client=self._httpx,
         )
+        # key -> [content, expiry (monotonic), hits]
+        self._completion_cache: dict[str, list] = {}
+        # Token bucket shared by all OpenRouter calls
+        self._rate = config.openrouter_rps
+        self._capacity = max(1.0, self._rate)
+        self._tokens = self._capacity
+        self._last_refill = time.monotonic()
+        self._rate_lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+    async def _acquire(self):
+        """Wait for a request token. The lock only guards the bucket; sleeping happens outside it."""
+        if self._rate <= 0:
+            return
+        while True:
+            async with self._rate_lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            await asyncio.sleep(wait)
+
+    async def close(self):
+        """Close the underlying HTTP connection pool."""
+        await self.client.close()
+
+    @staticmethod
+    def _cache_key(model: str, messages: list[dict], max_tokens: int) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{model}|{max_tokens}|".encode())
+        # Length-prefixed fields hash the prompt directly, without a json.dumps copy
+        for message in messages:
+            content = message["content"]
+            h.update(f"{message['role']}|{len(content)}|".encode())
+            h.update(content.encode())
+        return h.hexdigest()
+
+    def _cache_put(self, key: str, content: str, ttl: float):
+        now = time.monotonic()
+        cache = self._completion_cache
+        if key not in cache and len(cache) >= COMPLETION_CACHE_SIZE:
+            for k in [k for k, entry in cache.items() if entry[1] <= now]:
+                del cache[k]
+            if len(cache) >= COMPLETION_CACHE_SIZE:
+                # Evict the least frequently used entry
+                del cache[min(cache, key=lambda k: cache[k][2])]
+        cache[key] = [content, now + ttl, 0]
+
+    async def _cached_completion(
+        self, model: str, messages: list[dict], max_tokens: int,
+        parse: Callable[[str], Any], ttl: float = COMPLETION_CACHE_TTL_SECONDS,
+    ) -> Any:
+        """Return parse(completion content), reusing a cached response for identical prompts.
+
+        A response is only cached once parse accepts it, so a malformed reply
+        is requested again next time instead of being replayed.
+        """
+        key = self._cache_key(model, messages, max_tokens)
+        entry = self._completion_cache.get(key)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                entry[2] += 1
+                logger.info(f"Completion cache hit ({model})")
+                return parse(entry[0])
+            del self._completion_cache[key]
+
+        await self._acquire()
+        response = await self.client.chat.completions.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=messages,
+        )
+        content = response.choices[0].message.content
+        result = parse(content)
+        self._cache_put(key, content, ttl)
+        return result
 
-    async def chat(self, memory_context: str, messages: list[dict]) -> str:
-        """User-facing conversation using Sonnet."""
+    async def chat_stream(self, memory_context: str, messages: list[dict]) -> AsyncIterator[str]:
+        """User-facing conversation using Sonnet, yielding text as it is generated."""
         system_text = chat_system_prompt(memory_context)
 
-        response = await self.client.chat.completions.create(
+        await self._acquire()
+        stream = await self.client.chat.completions.create(
             model=self.config.chat_model,
             max_tokens=2048,
             messages=[
                 {"role": "system", "content": system_text},
                 *messages,
             ],
+            stream=True,
         )
 
-        return response.choices[0].message.content
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Release the HTTP response if the consumer stops early
+            await stream.close()
 
     async def synthesize(self, memory_context: str, conversation: str) -> dict:
         """Memory synthesis using cheap model. Returns dict of file updates."""
         prompt = synthesis_prompt(memory_context, conversation)
 
-        response = await self.client.chat.completions.create(
-            model=self.config.synthesis_model,
-            max_tokens=4096,
-            messages=[
-                {"role": "user", "content": prompt},
-            ],
-        )
-
-        text = response.choices[0].message.content
-        # Extract JSON from response (handle markdown code blocks)
-        if "```json" in text:
-            text = text.split("```json")[1].split("```")[0]
-        elif "```" in text:
-            text = text.split("```")[1].split("```")[0]
-
         try:
-            result = json.loads(text.strip())
+            # Extract JSON from response (handle markdown code blocks)
+            result = await self._cached_completion(
+                model=self.config.synthesis_model,
+                max_tokens=4096,
+                messages=[
+                    {"role": "user", "content": prompt},
+                ],
+                parse=_parse_json_response,
+            )
             logger.info(f"Synthesis reasoning: {result.get('reasoning', 'none')}")
             return result.get("updates", {})
         except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse synthesis response: {e}\nText: {text[:500]}")
+            logger.error(f"Failed to parse synthesis response: {e}\nText: {e.doc[:500]}")
             return {}
 
     async def think(self, lightweight_context: str, current_time: str, hours_since_last_message: float) -> dict:
         """Autonomy thinking using cheap model. Returns decision dict."""
         prompt = autonomy_thinking_prompt(lightweight_context, current_time, hours_since_last_message)
 
+        await self._acquire()
         response = await self.client.chat.completions.create(
             model=self.config.thinking_model,
             max_tokens=1024,
@@ -78,13 +199,9 @@ class ClaudeClient:
         )
 
         text = response.choices[0].message.content
-        if "```json" in text:
-            text = text.split("```json")[1].split("```")[0]
-        elif "```" in text:
-            text = text.split("```")[1].split("```")[0]
 
         try:
-            result = json.loads(text.strip())
+            result = _parse_json_response(text)
             logger.info(f"Autonomy thinking: {result.get('reasoning', 'none')}")
             return result
         except json.JSONDecodeError as e:
@@ -95,6 +212,7 @@ class ClaudeClient:
         """Compose a proactive message using quality model."""
         prompt = proactive_message_prompt(full_context, trigger_reason, current_time)
 
+        await self._acquire()
         response = await self.client.chat.completions.create(
             model=self.config.chat_model,
             max_tokens=1024,
@@ -11,7 +11,7 @@ class Config:
     webhook_url: str = ""  # e.g. https://your-app.railway.app
 
     # Telegram
-    allowed_user_ids: list[int] = field(default_factory=list)
+    allowed_user_ids: frozenset[int] = field(default_factory=frozenset)
 
     # Storage
     data_dir: str = "/data"
@@ -20,6 +20,7 @@ class Config:
     chat_model: str = "anthropic/claude-sonnet-4-5"
     synthesis_model: str = "anthropic/claude-haiku-4-5"
     thinking_model: str = "anthropic/claude-haiku-4-5"
+    openrouter_rps: float = 2.0  # Max OpenRouter requests/second (bursts up to this many)
 
     # Autonomy
     autonomy_interval_minutes: int = 60
@@ -35,7 +36,7 @@ class Config:
     @classmethod
     def from_env(cls) -> "Config":
         user_ids_str = os.getenv("ALLOWED_USER_IDS", "")
-        allowed_ids = [int(x.strip()) for x in user_ids_str.split(",") if x.strip()]
+        allowed_ids = frozenset(int(x) for x in user_ids_str.split(",") if x.strip())
 
         return cls(
             telegram_bot_token=os.environ["TELEGRAM_BOT_TOKEN"],
@@ -46,6 +47,7 @@ class Config:
             chat_model=os.getenv("CHAT_MODEL", "anthropic/claude-sonnet-4-5"),
             synthesis_model=os.getenv("SYNTHESIS_MODEL", "anthropic/claude-haiku-4-5"),
             thinking_model=os.getenv("THINKING_MODEL", "anthropic/claude-haiku-4-5"),
+            openrouter_rps=float(os.getenv("OPENROUTER_RPS", "2.0")),
             autonomy_interval_minutes=int(os.getenv("AUTONOMY_INTERVAL_MINUTES", "60")),
             quiet_hours_start=int(os.getenv("QUIET_HOURS_START", "23")),
             quiet_hours_end=int(os.getenv("QUIET_HOURS_END", "8")),
@@ -0,0 +1,7 @@
+"""JSON decoding shared by the webhook and LLM response parsing."""
+import json
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # Optional speedup; stdlib json is the fallback
+    json_loads = json.loads
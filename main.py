@@ -1,4 +1,6 @@
 """Entry point: Starlette webhook server + PTB Application + autonomy loop."""
+import asyncio
+import importlib.util
 import logging
 import os
 import sys
@@ -18,6 +20,7 @@ from memory import MemoryManager
 from claude_client import ClaudeClient
 from bot import AmbientBot
 from autonomy import AutonomyLoop
+from jsonutil import json_loads
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -30,10 +33,28 @@ ptb_app: Application = None
 ambient_bot: AmbientBot = None
 
 
+async def _greet_users(bot, config: Config):
+    """Send the startup greeting to all allowed users concurrently."""
+    user_ids = list(config.allowed_user_ids)
+    results = await asyncio.gather(
+        *(
+            bot.send_message(
+                chat_id=user_id,
+                text="Hey, I'm online. Memory loaded, autonomy loop running. Message me anytime.",
+            )
+            for user_id in user_ids
+        ),
+        return_exceptions=True,
+    )
+    for user_id, result in zip(user_ids, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Could not send startup greeting to {user_id}: {result}")
+
+
 async def telegram_webhook(request: Request):
     """Handle incoming Telegram webhook updates."""
     try:
-        data = await request.json()
+        data = json_loads(await request.body())
         update = Update.de_json(data, ptb_app.bot)
         await ptb_app.process_update(update)
         return PlainTextResponse("ok")
@@ -86,6 +107,11 @@ async def lifespan(app):
         first=config.autonomy_interval_minutes * 60,
         name="autonomy_loop",
     )
+    ptb_app.job_queue.run_repeating(
+        ambient_bot.sweep_sessions,
+        interval=config.session_timeout_minutes * 60,
+        name="session_sweep",
+    )
 
     # Set webhook
     webhook_url = f"{config.webhook_url}/telegram"
@@ -94,14 +120,7 @@ async def lifespan(app):
     logger.info("Ambient Claude started (webhook mode)")
 
     # Send startup greeting to allowed users
-    for user_id in config.allowed_user_ids:
-        try:
-            await ptb_app.bot.send_message(
-                chat_id=user_id,
-                text="Hey, I'm online. Memory loaded, autonomy loop running. Message me anytime.",
-            )
-        except Exception as e:
-            logger.warning(f"Could not send startup greeting to {user_id}: {e}")
+    await _greet_users(ptb_app.bot, config)
 
     yield
 
@@ -110,19 +129,27 @@ async def lifespan(app):
     await ptb_app.bot.delete_webhook()
     await ptb_app.stop()
     await ptb_app.shutdown()
+    await claude.close()
+    memory.close()
 
 
 async def send_startup_greeting(context):
     """Send greeting to all allowed users on startup."""
-    config = context.bot_data["config"]
-    for user_id in config.allowed_user_ids:
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text="Hey, I'm online. Memory loaded, autonomy loop running. Message me anytime.",
-            )
-        except Exception as e:
-            logger.warning(f"Could not send startup greeting to {user_id}: {e}")
+    await _greet_users(context.bot, context.bot_data["config"])
+
+
+def make_app() -> Starlette:
+    """Build the webhook ASGI app. Config is read in lifespan, not at import."""
+    return Starlette(
+        routes=[
+            Route("/telegram", telegram_webhook, methods=["POST"]),
+            Route("/health", health_check, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+app = make_app()
 
 
 def run_polling(config: Config):
@@ -130,28 +157,34 @@ def run_polling(config: Config):
     memory = MemoryManager(config.data_dir)
     claude = ClaudeClient(config)
 
-    app = ApplicationBuilder().token(config.telegram_bot_token).build()
-    app.bot_data["config"] = config
+    ptb = ApplicationBuilder().token(config.telegram_bot_token).build()
+    ptb.bot_data["config"] = config
 
     bot = AmbientBot(config, memory, claude)
-    bot.register_handlers(app)
+    bot.register_handlers(ptb)
 
     autonomy = AutonomyLoop(config, memory, claude)
     autonomy.set_bot(bot)
 
     # Register autonomy loop
-    app.job_queue.run_repeating(
+    ptb.job_queue.run_repeating(
         autonomy.run_cycle,
         interval=config.autonomy_interval_minutes * 60,
         first=config.autonomy_interval_minutes * 60,
         name="autonomy_loop",
     )
+    ptb.job_queue.run_repeating(
+        bot.sweep_sessions,
+        interval=config.session_timeout_minutes * 60,
+        name="session_sweep",
+    )
 
     # Send startup greeting once bot is ready
-    app.job_queue.run_once(send_startup_greeting, when=5, name="startup_greeting")
+    ptb.job_queue.run_once(send_startup_greeting, when=5, name="startup_greeting")
 
     logger.info("Ambient Claude started (polling mode)")
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    ptb.run_polling(allowed_updates=Update.ALL_TYPES)
+    memory.close()
 
 
 def main():
@@ -161,14 +194,15 @@ def main():
         run_polling(config)
     else:
         port = int(os.getenv("PORT", "8080"))
-        starlette_app = Starlette(
-            routes=[
-                Route("/telegram", telegram_webhook, methods=["POST"]),
-                Route("/health", health_check, methods=["GET"]),
-            ],
-            lifespan=lifespan,
+        # Prefer the C event loop and HTTP parser when installed
+        uvicorn.run(
+            app,
+            host="0.0.0.0",
+            port=port,
+            loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+            http="httptools" if importlib.util.find_spec("httptools") else "h11",
+            access_log=False,
         )
-        uvicorn.run(starlette_app, host="0.0.0.0", port=port)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,10 @@
 """Memory file I/O, context loading, and workspace management."""
+import asyncio
+import functools
+import hashlib
+import io
 import os
-import tempfile
-from datetime import datetime, timedelta, timezone
+import threading
 
 MEMORY_FILES = {
     "identity.md": """# Identity
@@ -45,6 +48,45 @@ occasionally reach out when I have something meaningful to share.
 """,
 }
 
+# Iteration orders, hoisted so hot paths walk a tuple instead of the dict
+_MEMORY_FILE_ORDER = tuple(MEMORY_FILES)
+# Files included in the lightweight (autonomy) context
+_LIGHTWEIGHT_FILES = ("identity.md", "active_threads.md", "queue.md")
+
+
+class StalePreconditionError(Exception):
+    """A memory file changed since the caller read it."""
+
+
+def content_sha256(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _unlink_quietly(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _write_all(fd: int, data: bytes):
+    """Write all of data to fd, continuing after short writes."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _write_fd(fd: int, content: str) -> tuple[int, int]:
+    """Write all of content to fd; return its (st_ino, st_mtime_ns)."""
+    _write_all(fd, content.encode())
+    st = os.fstat(fd)
+    return (st.st_ino, st.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=512)
+def _journal_path(journal_dir: str, date_str: str) -> str:
+    return os.path.join(journal_dir, f"{date_str}.md")
+
 
 class MemoryManager:
     def __init__(self, data_dir: str):
@@ -52,6 +94,19 @@ class MemoryManager:
         self.workspace_dir = os.path.join(data_dir, "workspace")
         self.journal_dir = os.path.join(self.workspace_dir, "journal")
         self.drafts_dir = os.path.join(self.workspace_dir, "drafts")
+        self._paths = {fn: os.path.join(self.memory_dir, fn) for fn in MEMORY_FILES}
+        self._valid_files = frozenset(MEMORY_FILES)
+        self._journal_fd: int | None = None
+        # Held across precondition checks and the renames they guard, so two
+        # writer threads can't both pass a check and then both replace
+        self._write_lock = threading.Lock()
+        self._journal_date: str | None = None
+        # File contents and built contexts are cached against each file's
+        # (st_ino, st_mtime_ns), so writes from any process invalidate them.
+        self._cache: dict[str, tuple[tuple[int, int], str]] = {}
+        # (stat keys, context, SHA-256 of each file the context was built from)
+        self._full_ctx_cache: tuple[tuple, str, dict[str, str]] | None = None
+        self._light_ctx_cache: tuple[tuple, str, dict[str, str]] | None = None
         self._ensure_dirs()
         self._seed_files()
 
@@ -61,91 +116,318 @@ class MemoryManager:
 
     def _seed_files(self):
         for filename, template in MEMORY_FILES.items():
-            path = os.path.join(self.memory_dir, filename)
-            if not os.path.exists(path):
-                self._atomic_write(path, template)
+            path = self._paths[filename]
+            # O_EXCL makes "create only if missing" one syscall, and atomic
+            # against a second process seeding the same volume
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                continue
+            try:
+                try:
+                    key = _write_fd(fd, template)
+                finally:
+                    os.close(fd)
+            except Exception:
+                _unlink_quietly(path)
+                raise
+            self._cache[filename] = (key, template)
 
-    def _atomic_write(self, path: str, content: str):
-        dir_name = os.path.dirname(path)
-        fd, tmp_path = tempfile.mkstemp(dir=dir_name, suffix=".tmp")
+    @staticmethod
+    def _write_temp(path: str, content: str) -> tuple[str, tuple[int, int]]:
+        """Write content next to path; return the temp path and its stat key."""
+        # pid + thread id keeps the temp name unique among concurrent writers
+        # without mkstemp's random-name probing
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
         try:
-            with os.fdopen(fd, "w") as f:
-                f.write(content)
-            os.replace(tmp_path, path)
-        except Exception:
             try:
-                os.unlink(tmp_path)
-            except OSError:
-                pass
+                key = _write_fd(fd, content)
+            finally:
+                os.close(fd)
+        except Exception:
+            _unlink_quietly(tmp_path)
             raise
+        return tmp_path, key
+
+    @staticmethod
+    def _stat_key(path: str) -> tuple[int, int] | None:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
 
     def _read_file(self, filename: str) -> str:
-        path = os.path.join(self.memory_dir, filename)
+        return self._read_with_key(filename, self._stat_key(self._paths[filename]))
+
+    def _read_with_key(self, filename: str, key: tuple[int, int] | None) -> str:
+        """Read a memory file whose stat key the caller already has."""
+        path = self._paths[filename]
+        if key is None:
+            self._cache.pop(filename, None)
+            return ""
+        cached = self._cache.get(filename)
+        if cached and cached[0] == key:
+            return cached[1]
         try:
             with open(path, "r") as f:
-                return f.read()
+                content = f.read()
         except FileNotFoundError:
             return ""
+        self._cache[filename] = (key, content)
+        return content
+
+    def _snapshot(self, filenames=_MEMORY_FILE_ORDER, keys: tuple | None = None) -> dict[str, str]:
+        """Read each memory file once, reusing stat keys from _context_key if given."""
+        if keys is None:
+            return {filename: self._read_file(filename) for filename in filenames}
+        return {filename: self._read_with_key(filename, key) for filename, key in zip(filenames, keys)}
+
+    def invalidate(self):
+        """Drop all cached file contents and contexts."""
+        self._cache.clear()
+        self._full_ctx_cache = None
+        self._light_ctx_cache = None
+
+    def _context_key(self, filenames) -> tuple:
+        return tuple(self._stat_key(self._paths[fn]) for fn in filenames)
+
+    def _load_context(self, filenames, build, cache_attr: str) -> tuple[str, dict[str, str]]:
+        key = self._context_key(filenames)
+        cached = getattr(self, cache_attr)
+        if cached and cached[0] == key:
+            return cached[1], cached[2]
+        snapshot = self._snapshot(filenames, key)
+        context = build(snapshot)
+        hashes = {filename: content_sha256(content) for filename, content in snapshot.items()}
+        setattr(self, cache_attr, (key, context, hashes))
+        return context, hashes
+
+    def load_full_context_with_hashes(self) -> tuple[str, dict[str, str]]:
+        """Full context plus the SHA-256 of each file it was built from.
+
+        Pass the hashes as update preconditions so writes derived from this
+        context can't clobber a file that changed after it was read.
+        """
+        return self._load_context(_MEMORY_FILE_ORDER, self._build_full_context, "_full_ctx_cache")
+
+    def load_lightweight_context_with_hashes(self) -> tuple[str, dict[str, str]]:
+        """Lightweight context plus the SHA-256 of each file it was built from."""
+        return self._load_context(_LIGHTWEIGHT_FILES, self._build_lightweight_context, "_light_ctx_cache")
+
+    def load_full_context(self, snapshot: dict[str, str] | None = None) -> str:
+        if snapshot is not None:
+            return self._build_full_context(snapshot)
+        return self.load_full_context_with_hashes()[0]
+
+    def load_lightweight_context(self, snapshot: dict[str, str] | None = None) -> str:
+        if snapshot is not None:
+            return self._build_lightweight_context(snapshot)
+        return self.load_lightweight_context_with_hashes()[0]
+
+    def _fresh(self, cached: tuple | None, filenames) -> tuple[str, dict[str, str]] | None:
+        if cached and cached[0] == self._context_key(filenames):
+            return cached[1], cached[2]
+        return None
+
+    async def load_full_context_with_hashes_async(self) -> tuple[str, dict[str, str]]:
+        """Like load_full_context_with_hashes, but rebuilds off the event loop on a cache miss."""
+        fresh = self._fresh(self._full_ctx_cache, _MEMORY_FILE_ORDER)
+        if fresh is not None:
+            return fresh
+        return await asyncio.to_thread(self.load_full_context_with_hashes)
+
+    async def load_lightweight_context_with_hashes_async(self) -> tuple[str, dict[str, str]]:
+        """Like load_lightweight_context_with_hashes, but rebuilds off the event loop on a cache miss."""
+        fresh = self._fresh(self._light_ctx_cache, _LIGHTWEIGHT_FILES)
+        if fresh is not None:
+            return fresh
+        return await asyncio.to_thread(self.load_lightweight_context_with_hashes)
+
+    async def load_full_context_async(self) -> str:
+        """Like load_full_context, but rebuilds off the event loop on a cache miss."""
+        return (await self.load_full_context_with_hashes_async())[0]
+
+    async def load_lightweight_context_async(self) -> str:
+        """Like load_lightweight_context, but rebuilds off the event loop on a cache miss."""
+        return (await self.load_lightweight_context_with_hashes_async())[0]
 
-    def load_full_context(self) -> str:
-        sections = []
-        for filename in MEMORY_FILES:
-            content = self._read_file(filename)
-            if content.strip():
-                sections.append(content)
-        return "\n\n---\n\n".join(sections)
-
-    def load_lightweight_context(self) -> str:
-        lightweight_files = ["identity.md", "active_threads.md", "queue.md"]
-        sections = []
-        for filename in lightweight_files:
-            content = self._read_file(filename)
-            if content.strip():
-                sections.append(content)
-        return "\n\n---\n\n".join(sections)
-
-    def update_file(self, filename: str, content: str):
-        if filename not in MEMORY_FILES:
+    @staticmethod
+    def _join_sections(snapshot: dict[str, str], filenames) -> str:
+        """Join non-empty files with separators, written straight into one buffer."""
+        buf = io.StringIO()
+        for filename in filenames:
+            content = snapshot[filename]
+            # isspace() stops at the first non-whitespace char, so unlike
+            # strip() this doesn't walk or copy the whole file
+            if not content or content.isspace():
+                continue
+            if buf.tell():
+                buf.write("\n\n---\n\n")
+            buf.write(content)
+        return buf.getvalue()
+
+    def _build_full_context(self, snapshot: dict[str, str]) -> str:
+        return self._join_sections(snapshot, _MEMORY_FILE_ORDER)
+
+    def _build_lightweight_context(self, snapshot: dict[str, str]) -> str:
+        return self._join_sections(snapshot, _LIGHTWEIGHT_FILES)
+
+    def _check_preconditions(self, expected_prev_sha256: dict[str, str]):
+        stale = [
+            filename for filename, digest in expected_prev_sha256.items()
+            if content_sha256(self._read_file(filename)) != digest
+        ]
+        if stale:
+            raise StalePreconditionError(f"{', '.join(stale)} changed since it was read")
+
+    def update_file(self, filename: str, content: str, expected_prev_sha256: str | None = None):
+        """Replace a memory file.
+
+        If expected_prev_sha256 is given, raise StalePreconditionError instead of
+        writing when the file no longer matches it (someone else updated it).
+        """
+        if filename not in self._valid_files:
             raise ValueError(f"Unknown memory file: {filename}")
-        path = os.path.join(self.memory_dir, filename)
-        self._atomic_write(path, content)
+        path = self._paths[filename]
+        tmp_path, key = self._write_temp(path, content)
+        try:
+            with self._write_lock:
+                if expected_prev_sha256 is not None:
+                    self._check_preconditions({filename: expected_prev_sha256})
+                os.replace(tmp_path, path)
+                self._cache[filename] = (key, content)
+        except Exception:
+            _unlink_quietly(tmp_path)
+            raise
+
+    async def update_file_async(self, filename: str, content: str, expected_prev_sha256: str | None = None):
+        await asyncio.to_thread(self.update_file, filename, content, expected_prev_sha256)
+
+    def update_files_batch(self, updates: dict[str, str], expected_prev_sha256: dict[str, str] | None = None):
+        """Replace several memory files together.
+
+        Every temp file is written before the first rename, so the renames
+        run back to back. Preconditions (as in update_file, keyed by filename)
+        are all checked, under the same lock as the renames, before any file
+        is replaced.
+        """
+        for filename in updates:
+            if filename not in self._valid_files:
+                raise ValueError(f"Unknown memory file: {filename}")
+
+        written = []
+        try:
+            for filename, content in updates.items():
+                written.append((filename, *self._write_temp(self._paths[filename], content)))
+        except Exception:
+            for _, tmp_path, _ in written:
+                _unlink_quietly(tmp_path)
+            raise
+
+        try:
+            with self._write_lock:
+                if expected_prev_sha256:
+                    self._check_preconditions(
+                        {fn: expected_prev_sha256[fn] for fn in updates if fn in expected_prev_sha256}
+                    )
+                for filename, tmp_path, key in written:
+                    os.replace(tmp_path, self._paths[filename])
+                    self._cache[filename] = (key, updates[filename])
+        except Exception:
+            # Temps already renamed into place are gone, so this only removes
+            # the ones a failed check or rename left behind
+            for _, tmp_path, _ in written:
+                _unlink_quietly(tmp_path)
+            raise
+
+    async def update_files_batch_async(self, updates: dict[str, str], expected_prev_sha256: dict[str, str] | None = None):
+        await asyncio.to_thread(self.update_files_batch, updates, expected_prev_sha256)
+
+    def _journal_fd_for(self, date_str: str, path: str) -> tuple[int, os.stat_result]:
+        """Return an O_APPEND fd for the day's journal and its fstat.
+
+        The fd is kept open until the date rolls over. Callers take the file
+        size from the returned stat, so an append costs one fstat.
+        """
+        fd = self._journal_fd
+        if fd is not None and self._journal_date == date_str:
+            st = os.fstat(fd)
+            if st.st_nlink:  # Not deleted out from under us
+                return fd, st
+        self.close()
+        fd = self._journal_fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._journal_date = date_str
+        return fd, os.fstat(fd)
+
+    def close(self):
+        """Close the cached journal file descriptor."""
+        if self._journal_fd is not None:
+            os.close(self._journal_fd)
+            self._journal_fd = None
+            self._journal_date = None
 
     def add_journal_entry(self, content: str) -> str:
+        from datetime import datetime, timezone  # Deferred: only journaling needs it
+
         now = datetime.now(timezone.utc)
-        date_str = now.strftime("%Y-%m-%d")
+        date_str = now.date().isoformat()
         time_str = now.strftime("%H:%M UTC")
-        filename = f"{date_str}.md"
-        path = os.path.join(self.journal_dir, filename)
+        path = _journal_path(self.journal_dir, date_str)
 
         entry = f"\n## {time_str}\n\n{content}\n"
 
-        if os.path.exists(path):
-            with open(path, "r") as f:
-                existing = f.read()
-            self._atomic_write(path, existing + entry)
-        else:
-            header = f"# Journal — {date_str}\n"
-            self._atomic_write(path, header + entry)
+        # Journals only ever grow, so there's no need for the atomic replace:
+        # O_APPEND writes land at the end of the file
+        fd, st = self._journal_fd_for(date_str, path)
+        if st.st_size == 0:
+            entry = f"# Journal — {date_str}\n" + entry
+        _write_all(fd, entry.encode())
 
         return path
 
-    def get_recent_journal_entries(self, days: int = 7) -> str:
-        entries = []
-        now = datetime.now(timezone.utc)
-        for i in range(days):
-            date = now - timedelta(days=i)
-            date_str = date.strftime("%Y-%m-%d")
-            filename = f"{date_str}.md"
-            path = os.path.join(self.journal_dir, filename)
-            if os.path.exists(path):
-                with open(path, "r") as f:
-                    entries.append(f.read())
+    def _journal_paths(self, days: int) -> list[str]:
+        """Journal files from the last `days` days, newest first, from one directory scan."""
+        from datetime import datetime, timedelta, timezone  # Deferred: only journaling needs it
+
+        today = datetime.now(timezone.utc).date()
+        newest = today.isoformat()
+        oldest = (today - timedelta(days=days - 1)).isoformat()
+        with os.scandir(self.journal_dir) as it:
+            found = [
+                (entry.name, entry.path)
+                for entry in it
+                if len(entry.name) == 13  # YYYY-MM-DD.md
+                and entry.name.endswith(".md")
+                and oldest <= entry.name[:-3] <= newest
+                and entry.is_file()
+            ]
+        found.sort(reverse=True)
+        return [path for _, path in found]
+
+    @staticmethod
+    def _read_journal(path: str) -> str | None:
+        try:
+            with open(path, "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _join_journal(contents) -> str:
+        entries = [c for c in contents if c is not None]
         return "\n\n".join(entries) if entries else "*No recent journal entries.*"
 
-    def get_memory_debug(self) -> str:
+    def get_recent_journal_entries(self, days: int = 7) -> str:
+        return self._join_journal(map(self._read_journal, self._journal_paths(days)))
+
+    def get_memory_debug(self, snapshot: dict[str, str] | None = None) -> str:
+        if snapshot is None:
+            snapshot = self._snapshot()
         output = []
-        for filename in MEMORY_FILES:
-            content = self._read_file(filename)
+        for filename in _MEMORY_FILE_ORDER:
+            content = snapshot[filename]
             lines = content.strip().split("\n")
             preview = "\n".join(lines[:5])
             if len(lines) > 5: